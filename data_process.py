@@ -1,10 +1,15 @@
+import base64
 import requests
 import pandas as pd
+import polars as pl
+import pyarrow as pa
 from datetime import datetime, time
 from get_data import fetch_data_from_api
 
 # Global variable to store the data
 data_store = pd.DataFrame()
+# Bumped on every store update so cached reads of data_store can be invalidated
+data_version = 0
 
 # Function to process data
 def process_data(data):
@@ -34,20 +39,34 @@ def process_data(data):
                 print(f"Missing column: {col}")
                 df[col] = None
         
+        # The sensor readings fit comfortably in float32, which halves the store's footprint
+        parameter_columns = required_columns[1:]
+        df[parameter_columns] = df[parameter_columns].astype('float32')
+        
         return df.sort_values('timestamp')
     except Exception as e:
         print(f"Error processing data: {e}")
         return pd.DataFrame()
 
 def process_and_store_data(api_url):
-    global data_store
+    global data_store, data_version
     data = fetch_data_from_api(api_url)
     if data:
         new_data = process_data(data)
-        data_store = pd.concat([data_store, new_data]).drop_duplicates().sort_values('timestamp')
-        print("Data updated successfully")
+        updated_store = pd.concat([data_store, new_data]).drop_duplicates().sort_values('timestamp')
+        # The API returns the full history on every call; the store only ever
+        # grows, so an unchanged length means nothing new arrived
+        if len(updated_store) != len(data_store):
+            data_store = updated_store
+            data_version += 1
+            print("Data updated successfully")
+        else:
+            print("No new data to update")
     else:
         print("No new data to update")
+
+def get_data_version():
+    return data_version
     
 def get_todays_data():
     global data_store
@@ -60,8 +79,41 @@ def get_todays_data():
         # Filter for today's data
         today_data = data_store[data_store['timestamp'].dt.date == today]
         print("Today's data:", today_data)
-        return today_data
+        # Sorted DatetimeIndex so time-range slicing is a binary search
+        return today_data.set_index('timestamp').sort_index()
     except Exception as e:
         print("Error occurred in get_todays_data:", e)
         return pd.DataFrame()  # Return an empty DataFrame in case of error
-    
+
+# Rows of a timestamp-indexed frame within [start_time, end_time]; the index is
+# sorted, so both ends are found by binary search and the result is a slice
+def slice_time_range(df, start_time, end_time):
+    timestamps = df.index.values
+    lo = timestamps.searchsorted(pd.Timestamp(start_time).to_datetime64(), side='left')
+    hi = timestamps.searchsorted(pd.Timestamp(end_time).to_datetime64(), side='right')
+    return df.iloc[lo:hi]
+
+# Per-window mean of the given columns over a sorted DatetimeIndex; `every` is a
+# Polars duration string ('10m', '1h', '1d', ...). Windows without samples are
+# kept as NaN rows, like resample().mean(), so outages show as gaps in the plot
+def resample_mean(df, every, columns):
+    if df.empty:
+        return pd.DataFrame(columns=['timestamp', *columns])
+    return (
+        pl.from_pandas(df[columns].reset_index())
+        .group_by_dynamic('timestamp', every=every)
+        .agg([pl.col(column).mean() for column in columns])
+        .upsample('timestamp', every=every)
+        .to_pandas()
+    )
+
+# Serialize a DataFrame as a base64 Arrow IPC stream for dcc.Store
+def serialize_frame(df):
+    table = pa.Table.from_pandas(df)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return base64.b64encode(sink.getvalue().to_pybytes()).decode()
+
+def deserialize_frame(data):
+    return pa.ipc.open_stream(base64.b64decode(data)).read_all().to_pandas()
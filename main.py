@@ -1,16 +1,27 @@
 import os
-from dash import Dash, html, dcc, callback, Output, Input, State, dash_table
+import functools
+import uuid
+from collections import OrderedDict
+from dash import Dash, html, dcc, callback, ctx, Output, Input, State, Patch, dash_table
+from dash.dash_table.Format import Format, Scheme
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objs as go
+import plotly.io as pio
+from plotly_resampler import FigureResampler
 from datetime import datetime, timedelta
 import numpy as np
 import io
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import flask
 
 # Import the data processing functions from provided files
-from data_process import process_data, process_and_store_data, get_todays_data
+from data_process import (process_data, process_and_store_data, get_todays_data, get_data_version,
+                          slice_time_range, resample_mean, serialize_frame, deserialize_frame)
 
 from get_data import fetch_data_from_api
 
@@ -22,6 +33,13 @@ PARAMETERS = {
     'FlowInd': {'name': 'Flow Rate', 'unit': 'kL/10min', 'color': '#d62728', 'range': [0, 100]}
 }
 
+# Legend labels for the time-series traces
+for param_config in PARAMETERS.values():
+    param_config['label'] = f"{param_config['name']} ({param_config['unit']})" if param_config['unit'] else param_config['name']
+
+# Parameter column names, usable directly as a DataFrame column selection
+PARAM_KEYS = list(PARAMETERS.keys())
+
 TIME_RANGES = {
     '1H': '1 Hour',
     '6H': '6 Hours',
@@ -31,14 +49,27 @@ TIME_RANGES = {
     'Custom': 'Custom Range'
 }
 
+# Polars durations for group_by_dynamic
 AGGREGATIONS = {
-    '10 Min': '10T',  # Raw data interval
-    '30 Min': '30T',
-    '1 Hour': 'H',
-    '4 Hour': '4H',
-    'Daily': 'D'
+    '10 Min': '10m',  # Raw data interval
+    '30 Min': '30m',
+    '1 Hour': '1h',
+    '4 Hour': '4h',
+    'Daily': '1d'
+}
+
+EXPORT_DECIMALS = 4
+
+EXPORT_FORMATS = {
+    'Excel': 'xlsx',
+    'CSV': 'csv',
+    'Parquet': 'parquet'
 }
 
+# Dash serializes layouts and callback responses through plotly.io.json,
+# use orjson there instead of the stdlib encoder
+pio.json.config.default_engine = 'orjson'
+
 # API URL Configuration
 API_URL = "https://mongodb-api-hmeu.onrender.com"
 # Initialize Flask
@@ -55,6 +86,26 @@ app = Dash(
 )
 app.title = 'Water Quality Monitoring'
 
+# Resampled time-series figures, one per browser session, so zoom callbacks
+# resample the caller's own figure; the least recently used ones are dropped
+MAX_SESSION_FIGURES = 100
+session_figures = OrderedDict()
+session_figures_lock = threading.Lock()
+
+def store_session_figure(session_id, fig):
+    with session_figures_lock:
+        session_figures[session_id] = fig
+        session_figures.move_to_end(session_id)
+        while len(session_figures) > MAX_SESSION_FIGURES:
+            session_figures.popitem(last=False)
+
+def get_session_figure(session_id):
+    with session_figures_lock:
+        fig = session_figures.get(session_id)
+        if fig is not None:
+            session_figures.move_to_end(session_id)
+        return fig
+
 
 # Add a basic Flask route for the root URL
 @server.route('/')
@@ -108,7 +159,7 @@ app.layout = dbc.Container([
                         id='parameter-select',
                         options=[{'label': params['name'], 'value': param} 
                                 for param, params in PARAMETERS.items()],
-                        value=list(PARAMETERS.keys())[0],
+                        value=PARAM_KEYS[0],
                         multi=True,
                         className="mb-3"
                     ),
@@ -137,7 +188,16 @@ app.layout = dbc.Container([
                     dcc.Dropdown(
                         id='aggregation-select',
                         options=[{'label': k, 'value': v} for k, v in AGGREGATIONS.items()],
-                        value='10T',
+                        value='10m',
+                        className="mb-3"
+                    ),
+                    
+                    html.Label("Export Format"),
+                    dcc.Dropdown(
+                        id='export-format-select',
+                        options=[{'label': k, 'value': v} for k, v in EXPORT_FORMATS.items()],
+                        value='xlsx',
+                        clearable=False,
                         className="mb-3"
                     ),
                     
@@ -186,6 +246,9 @@ app.layout = dbc.Container([
                 dbc.CardBody([
                     dash_table.DataTable(
                         id='data-table',
+                        columns=[{'name': 'timestamp', 'id': 'timestamp', 'type': 'datetime'}] +
+                                [{'name': param, 'id': param, 'type': 'numeric',
+                                  'format': Format(precision=2, scheme=Scheme.fixed)} for param in PARAM_KEYS],
                         style_table={'overflowX': 'auto'},
                         style_cell={
                             'textAlign': 'left',
@@ -196,9 +259,14 @@ app.layout = dbc.Container([
                             'backgroundColor': '#f8f9fa',
                             'fontWeight': 'bold'
                         },
+                        # Paging, sorting and filtering run server-side so only the visible page is sent
+                        page_current=0,
                         page_size=10,
-                        sort_action='native',
-                        filter_action='native'
+                        page_action='custom',
+                        sort_action='custom',
+                        sort_by=[],
+                        filter_action='custom',
+                        filter_query=''
                     )
                 ])
             ])
@@ -208,56 +276,104 @@ app.layout = dbc.Container([
     dcc.Download(id="download-data"),
     dcc.Interval(id='update-interval', interval=600000, n_intervals=0),  # 10 minutes
     dcc.Interval(id='clock-interval', interval=1000, n_intervals=0),  # 1 second
+    dcc.Store(id='raw-store'),
     dcc.Store(id='data-store'),
+    dcc.Store(id='render-key'),
+    dcc.Store(id='session-id'),
     
 ], fluid=True, className="px-4 py-3")
 
-@app.callback(
+# Pure UI updates run in the browser, without a server round-trip
+app.clientside_callback(
+    """
+    function(selected_range) {
+        return {'display': selected_range === 'Custom' ? 'block' : 'none'};
+    }
+    """,
     Output('custom-date-container', 'style'),
     Input('time-range-select', 'value')
 )
-def toggle_custom_date(selected_range):
-    if selected_range == 'Custom':
-        return {'display': 'block'}
-    return {'display': 'none'}
 
-@app.callback(
+app.clientside_callback(
+    """
+    function(n) {
+        const now = new Date();
+        const pad = (value) => String(value).padStart(2, '0');
+        return `${now.getFullYear()}-${pad(now.getMonth() + 1)}-${pad(now.getDate())} ` +
+               `${pad(now.getHours())}:${pad(now.getMinutes())}:${pad(now.getSeconds())}`;
+    }
+    """,
     Output('live-timestamp', 'children'),
     Input('clock-interval', 'n_intervals')
 )
-def update_timestamp(n):
-    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# Single background worker for API fetches; ticks from several clients share one in-flight fetch
+fetch_executor = ThreadPoolExecutor(max_workers=1)
+fetch_lock = threading.Lock()
+latest_fetch = None
+
+def refresh_store():
+    global latest_fetch
+    with fetch_lock:
+        if latest_fetch is None or latest_fetch.done():
+            latest_fetch = fetch_executor.submit(process_and_store_data, API_URL)
+        fetch = latest_fetch
+    fetch.result()
+
+@functools.lru_cache(maxsize=2)
+def load_todays_data(data_version, today):
+    # Cached per store update (and day), so repeated reads within a tick skip the parse
+    return {
+        'version': f"{today}/{data_version}",
+        'frame': serialize_frame(get_todays_data())
+    }
+
+@app.callback(
+    Output('raw-store', 'data'),
+    Input('update-interval', 'n_intervals')
+)
+def refresh_data(n_intervals):
+    # Fetch and process new data using imported functions
+    refresh_store()
+    return load_todays_data(get_data_version(), datetime.now().date())
 
 @app.callback(
     [Output('time-series-plot', 'figure'),
-     Output('data-table', 'data'),
-     Output('data-table', 'columns'),
-     Output('data-store', 'data')] +
-    [Output(f"{param}-value", 'children') for param in PARAMETERS.keys()],
+     Output('data-store', 'data'),
+     Output('render-key', 'data'),
+     Output('session-id', 'data')] +
+    [Output(f"{param}-value", 'children') for param in PARAM_KEYS],
     [Input('parameter-select', 'value'),
      Input('time-range-select', 'value'),
      Input('aggregation-select', 'value'),
      Input('date-picker-range', 'start_date'),
      Input('date-picker-range', 'end_date'),
-     Input('update-interval', 'n_intervals')]
+     Input('raw-store', 'data')],
+    [State('render-key', 'data'),
+     State('session-id', 'data')]
 )
-def update_dashboard(selected_params, time_range, aggregation, custom_start, custom_end, n_intervals):
-    # Fetch and process new data using imported functions
-    process_and_store_data(API_URL)
-    df = get_todays_data()
-    
-    if df.empty:
-        return px.line(), [], [], {}, *['--' for _ in PARAMETERS]
-    
-
-
+def update_dashboard(selected_params, time_range, aggregation, custom_start, custom_end, raw_data,
+                     last_key, session_id):
+    session_id = session_id or uuid.uuid4().hex
+    if not raw_data:
+        return px.line(), {}, None, session_id, *['--' for _ in PARAMETERS]
     
     # Ensure selected_params is a list
     if isinstance(selected_params, str):
         selected_params = [selected_params]
     
+    # Skip re-fires with the same inputs and data as this client's last render
+    key = [selected_params, time_range, aggregation, custom_start, custom_end, raw_data['version']]
+    if key == last_key:
+        raise PreventUpdate
+    
+    df = deserialize_frame(raw_data['frame'])
+    
+    if df.empty:
+        return px.line(), {}, None, session_id, *['--' for _ in PARAMETERS]
+    
     # Time range filtering
-    end_time = df['timestamp'].max()
+    end_time = df.index.max()
     if time_range == 'Custom' and custom_start and custom_end:
         start_time = pd.to_datetime(custom_start)
         end_time = pd.to_datetime(custom_end)
@@ -268,75 +384,166 @@ def update_dashboard(selected_params, time_range, aggregation, custom_start, cus
         }
         start_time = end_time - pd.Timedelta(hours=hours_delta.get(time_range, 6))
     
-    df_filtered = df[df['timestamp'].between(start_time, end_time)]
+    df_filtered = slice_time_range(df, start_time, end_time)
     
     # Aggregation
-    df_agg = df_filtered.resample(aggregation, on='timestamp').agg({
-        param: 'mean' for param in PARAMETERS.keys()
-    }).reset_index()
-    
-    # Create time series plot
-    fig = go.Figure()
-    for param in selected_params:
-        param_config = PARAMETERS[param]
-        fig.add_trace(go.Scatter(
-            x=df_agg['timestamp'],
-            y=df_agg[param],
-            name=f"{param_config['name']} ({param_config['unit']})" if param_config['unit'] else param_config['name'],
-            line=dict(color=param_config['color'])
-        ))
+    df_agg = resample_mean(df_filtered, aggregation, PARAM_KEYS)
     
-    fig.update_layout(
-        margin=dict(l=50, r=20, t=20, b=50),
-        xaxis_title="Time",
-        yaxis_title="Value",
-        hovermode='x unified',
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        ),
-        template="plotly_white"
-    )
+    # Create time series plot; the figure is assembled as a dict and handed over
+    # without plotly's per-property validation, the resampler then takes its traces
+    fig = FigureResampler(go.Figure({
+        'data': [
+            {
+                'type': 'scattergl',
+                'x': df_agg['timestamp'].values,
+                'y': df_agg[param].values,
+                'name': PARAMETERS[param]['label'],
+                'line': {'color': PARAMETERS[param]['color']}
+            }
+            for param in selected_params
+        ],
+        'layout': {
+            'margin': {'l': 50, 'r': 20, 't': 20, 'b': 50},
+            'xaxis': {'title': {'text': 'Time'}},
+            'yaxis': {'title': {'text': 'Value'}},
+            'hovermode': 'x unified',
+            'legend': {
+                'orientation': 'h',
+                'yanchor': 'bottom',
+                'y': 1.02,
+                'xanchor': 'right',
+                'x': 1
+            },
+            'template': pio.templates['plotly_white']
+        }
+    }, _validate=False), default_n_shown_samples=1000)
+    store_session_figure(session_id, fig)
     
-    # Prepare table data
-    table_data = df_agg.to_dict('records')
-    columns = [{"name": i, "id": i} for i in df_agg.columns]
+    # An interval tick with unchanged filters only swaps the trace data; the
+    # browser keeps its layout and the full figure is not re-sent
+    if ctx.triggered_id == 'raw-store' and last_key and last_key[:-1] == key[:-1]:
+        figure = Patch()
+        for i, trace in enumerate(fig.data):
+            figure['data'][i]['x'] = trace.x
+            figure['data'][i]['y'] = trace.y
+            figure['data'][i]['name'] = trace.name
+    else:
+        figure = fig
     
     # Get latest values for metric cards
-    latest_values = []
-    latest_row = df.iloc[-1]
-    for param in PARAMETERS.keys():
-        latest_values.append(f"{latest_row[param]:.2f}")
+    latest_row = df.iloc[-1:][PARAM_KEYS].to_numpy()[0]
+    latest_values = [f"{value:.2f}" for value in latest_row]
     
     # Store data for export
-    stored_data = df_agg.to_json(date_format='iso', orient='split')
+    stored_data = serialize_frame(df_agg)
     
-    return fig, table_data, columns, stored_data, *latest_values
+    return figure, stored_data, key, session_id, *latest_values
+
+FILTER_OPERATORS = [['ge ', '>='], ['le ', '<='], ['lt ', '<'], ['gt ', '>'],
+                    ['ne ', '!='], ['eq ', '='], ['contains '], ['datestartswith ']]
+
+def split_filter_part(filter_part):
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+                value_part = value_part.strip()
+                v0 = value_part[0] if value_part else ''
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', '`'):
+                    value_part = value_part[1:-1].replace('\\' + v0, v0)
+                return name, operator_type[0].strip(), value_part
+    return [None] * 3
+
+def filter_table(df, filter_query):
+    for filter_part in (filter_query or '').split(' && '):
+        col_name, operator, filter_value = split_filter_part(filter_part)
+        if col_name not in df.columns:
+            continue
+        try:
+            if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+                if pd.api.types.is_numeric_dtype(df[col_name]):
+                    filter_value = float(filter_value)
+                df = df.loc[getattr(df[col_name], operator)(filter_value)]
+            elif operator == 'contains':
+                df = df.loc[df[col_name].astype(str).str.contains(filter_value, regex=False)]
+            elif operator == 'datestartswith':
+                df = df.loc[df[col_name].astype(str).str.startswith(filter_value)]
+        except (TypeError, ValueError) as e:
+            print(f"Ignoring table filter '{filter_part}': {e}")
+    return df
+
+@app.callback(
+    [Output('data-table', 'data'),
+     Output('data-table', 'page_count')],
+    [Input('data-table', 'page_current'),
+     Input('data-table', 'page_size'),
+     Input('data-table', 'sort_by'),
+     Input('data-table', 'filter_query'),
+     Input('data-store', 'data')]
+)
+def update_table(page_current, page_size, sort_by, filter_query, stored_data):
+    if not stored_data:
+        return [], 0
+    
+    df = filter_table(deserialize_frame(stored_data), filter_query)
+    if sort_by:
+        df = df.sort_values(
+            [col['column_id'] for col in sort_by],
+            ascending=[col['direction'] == 'asc' for col in sort_by]
+        )
+    
+    # Only the requested page is converted and sent to the browser
+    page = df.iloc[page_current * page_size:(page_current + 1) * page_size]
+    columns = page.columns.tolist()
+    table_data = [dict(zip(columns, row)) for row in page.itertuples(index=False, name=None)]
+    return table_data, math.ceil(len(df) / page_size)
+
+# Resample the visible window on zoom/pan instead of redrawing the whole figure
+@app.callback(
+    Output('time-series-plot', 'figure', allow_duplicate=True),
+    Input('time-series-plot', 'relayoutData'),
+    State('session-id', 'data'),
+    prevent_initial_call=True
+)
+def resample_time_series(relayout_data, session_id):
+    fig = get_session_figure(session_id)
+    if fig is None:
+        raise PreventUpdate
+    return fig.construct_update_data_patch(relayout_data)
 
 @app.callback(
     Output("download-data", "data"),
     Input("export-btn", "n_clicks"),
+    State('export-format-select', 'value'),
     State('data-store', 'data'),
     prevent_initial_call=True
 )
-def export_data(n_clicks, stored_data):
+def export_data(n_clicks, export_format, stored_data):
     if not n_clicks or not stored_data:
         return None
     
-    df = pd.read_json(stored_data, orient='split')
+    df = deserialize_frame(stored_data)
+    # Readings are kept as float32; widen and round them so exported files
+    # hold 7.3 rather than 7.300000190734863
+    df[PARAM_KEYS] = df[PARAM_KEYS].astype('float64').round(EXPORT_DECIMALS)
+    filename = f"water_quality_data_{datetime.now().strftime('%Y%m%d_%H%M')}.{export_format}"
+    if export_format == 'csv':
+        return dcc.send_data_frame(df.to_csv, filename, index=False)
+    if export_format == 'parquet':
+        return dcc.send_data_frame(df.to_parquet, filename, index=False)
+    # xlsxwriter writes the sheet XML directly instead of building an openpyxl object tree
     return dcc.send_data_frame(
         df.to_excel,
-        f"water_quality_data_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
+        filename,
+        engine='xlsxwriter',
         sheet_name="Data",
         index=False
     )
 
 if __name__ == '__main__':
     # Initial data fetch
-    process_and_store_data(API_URL)
+    refresh_store()
     
     # Get deployment configuration from environment variables
     port = int(os.environ.get('PORT', 8080))